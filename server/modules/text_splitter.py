@@ -1,6 +1,11 @@
-import regex as re
-from typing import List, Tuple
+import re
+import unicodedata
+from bisect import bisect_left
+from collections import deque
 from functools import lru_cache
+from typing import Iterator, List, Tuple
+
+import numpy as np
 
 # Separator weight constants
 WEIGHTS = (4, 3, 2, 1, 0)
@@ -12,19 +17,99 @@ WEIGHTS = (4, 3, 2, 1, 0)
     NO_WEIGHT,
 ) = WEIGHTS
 
+# Characters with the Unicode STerm (sentence terminator) property.
+# `unicodedata` exposes general categories but not STerm, so the set is
+# precomputed here (generated from the Unicode property data).
+_STERM_CHARS = (
+    "!.?։؝؞؟۔܀܁܂߹࠷࠹࠽࠾।॥၊။።፧፨᙮᜵᜶។៕᠃᠉᥄᥅᪨᪩᪪᪫᭎᭏᭚᭛᭞᭟᭽᭾᭿"
+    "᰻᰼᱾᱿․‼‽⁇⁈⁉⳹⳺⳻⸮⸼⹓⹔。꓿꘎꘏꛳꛷꡶꡷꣎꣏꤯꧈꧉꩝꩞꩟꫰꫱꯫︒︕︖﹒﹖﹗！．？｡"
+    "𐩖𐩗𐽕𐽖𐽗𐽘𐽙𐾆𐾇𐾈𐾉𑁇𑁈𑂾𑂿𑃀𑃁𑅁𑅂𑅃𑇅𑇆𑇍𑇞𑇟𑈸𑈹𑈻𑈼𑊩\U000113d4\U000113d5𑑋𑑌"
+    "𑗂𑗃𑗉𑗊𑗋𑗌𑗍𑗎𑗏𑗐𑗑𑗒𑗓𑗔𑗕𑗖𑗗𑙁𑙂𑜼𑜽𑜾𑥄𑥆𑩂𑩃𑪛𑪜𑱁𑱂𑻷𑻸\U00011f43\U00011f44"
+    "𖩮𖩯𖫵𖬷𖬸𖭄\U00016d6e\U00016d6f𖺘𛲟𝪈"
+)
+_STERM_SET = frozenset(_STERM_CHARS)
+
+# Unicode general category -> separator weight
+_CATEGORY_WEIGHT = {
+    "Zl": PARAGRAPH_SEPARATOR_WEIGHT,
+    "Zp": PARAGRAPH_SEPARATOR_WEIGHT,
+    "Po": OTHER_PUNCTUATION_WEIGHT,
+    "Zs": SPACE_WEIGHT,
+}
+
+# Bound once at import; get_weight runs per character, and resolving
+# these through module/attribute lookups on every call adds up.
+_category = unicodedata.category
+_category_weight_get = _CATEGORY_WEIGHT.get
+
+
+def _classify_char(char: str) -> int:
+    """Full classification; used for non-ASCII characters and to seed
+    the ASCII table below."""
+    if char == "\n" or char == "\r":
+        return PARAGRAPH_SEPARATOR_WEIGHT
+    if char in _STERM_SET:
+        return SENTENCE_TERMINATOR_WEIGHT
+    return _category_weight_get(_category(char), NO_WEIGHT)
+
+
+# Real-world input is dominated by ASCII, so resolve the first 128 code
+# points with a single indexed load instead of set and category lookups.
+_ASCII_WEIGHTS = bytes(_classify_char(chr(code)) for code in range(128))
+
 
-@lru_cache(maxsize=4096)
 def get_weight(char: str) -> int:
     """Determine the weight of a character for splitting purposes."""
-    if re.match(r"[\n\r]|\p{Zl}|\p{Zp}", char):
-        return PARAGRAPH_SEPARATOR_WEIGHT
-    elif re.match(r"\p{STerm}", char):
-        return SENTENCE_TERMINATOR_WEIGHT
-    elif re.match(r"\p{Po}", char):
-        return OTHER_PUNCTUATION_WEIGHT
-    elif re.match(r"\p{Zs}", char):
-        return SPACE_WEIGHT
-    return NO_WEIGHT
+    code = ord(char)
+    if code < 128:
+        return _ASCII_WEIGHTS[code]
+    return _classify_char(char)
+
+
+# str.translate map sending every pre-classified code point to its
+# weight as a control character '\x00'..'\x04'. Beyond ASCII and the
+# STerm set, the blocks below (general punctuation, CJK punctuation,
+# fullwidth/halfwidth forms) cover the non-ASCII separators that
+# actually occur in crawled text; anything else takes the slow path.
+_WEIGHT_TRANSLATION = {code: int(_ASCII_WEIGHTS[code]) for code in range(128)}
+_WEIGHT_TRANSLATION.update(
+    (ord(char), SENTENCE_TERMINATOR_WEIGHT) for char in _STERM_CHARS
+)
+for _code in (
+    *range(0x2000, 0x2070),
+    *range(0x3000, 0x3040),
+    *range(0xFE30, 0xFE50),
+    *range(0xFF00, 0xFFF0),
+):
+    _WEIGHT_TRANSLATION.setdefault(_code, _classify_char(chr(_code)))
+
+# After translation, any byte outside '\x00'..'\x04' marks a character
+# the map didn't cover ('?' for non-latin-1 code points).
+_UNMAPPED_RUN = re.compile(rb"[^\x00-\x04]+")
+
+
+@lru_cache(maxsize=8)
+def _special_tokens_overhead(tokenizer) -> int:
+    """Number of special tokens the tokenizer adds around a sequence.
+
+    Constant for a given tokenizer, so probe it once instead of on
+    every split_text_into_chunks call.
+    """
+    return len(tokenizer.encode("", add_special_tokens=True))
+
+
+def get_text_weights(text: str) -> bytes:
+    """Weights of every character of text, computed in one C-level pass.
+
+    str.translate maps the covered code points directly to weight bytes;
+    only the rare unmapped characters are classified individually.
+    """
+    mapped = text.translate(_WEIGHT_TRANSLATION)
+    weights = bytearray(mapped.encode("latin-1", "replace"))
+    for run in _UNMAPPED_RUN.finditer(weights):
+        for i in range(run.start(), run.end()):
+            weights[i] = get_weight(text[i])
+    return bytes(weights)
 
 
 def split_text_into_chunks(
@@ -34,7 +119,9 @@ def split_text_into_chunks(
 
     Args:
         text: Input text to be split
-        tokenizer: Tokenizer object with encode method
+        tokenizer: HuggingFace fast (Rust-backed) tokenizer; it is
+            called with return_offsets_mapping=True, which slow
+            Python tokenizers do not support
         max_tokens: Maximum number of tokens per chunk
 
     Returns:
@@ -43,198 +130,322 @@ def split_text_into_chunks(
     if not isinstance(max_tokens, int) or max_tokens <= 0:
         raise ValueError("max_tokens must be a positive integer")
 
-    def get_token_count(segment: str) -> int:
-        """Get token count for a text segment."""
-        return len(
-            tokenizer.encode(
-                segment,
-                add_special_tokens=True,
-                truncation=True,
-                max_length=max_tokens + 1,
-            )
-        )
+    # Classify every character exactly once up front; everything below
+    # works from separator positions derived from this buffer rather
+    # than re-classifying characters.
+    weights = get_text_weights(text)
+    weights_np = np.frombuffer(weights, dtype=np.uint8)
+
+    # Separator positions for each weight level, computed once for the
+    # whole input (a separator of weight w also splits at every level
+    # below w). Sub-ranges select their portion with two binary
+    # searches instead of re-scanning their characters per level.
+    separators_from_weight = {w: np.nonzero(weights_np >= w)[0] for w in WEIGHTS[:-1]}
+
+    # Tokenize the whole text exactly once. Every chunk and candidate
+    # split considered below is a contiguous range of the input, so its
+    # token count is the number of tokens starting inside the range —
+    # two binary searches on the sorted token start offsets — plus the
+    # constant special-token overhead the tokenizer adds per sequence.
+    special_tokens_overhead = _special_tokens_overhead(tokenizer)
+    token_starts = [
+        offset[0]
+        for offset in tokenizer(
+            text, add_special_tokens=False, return_offsets_mapping=True
+        )["offset_mapping"]
+    ]
+
+    # The same boundary positions recur constantly: every binary-search
+    # probe shares its chunk-start anchor, and greedy packing re-counts
+    # from the open chunk's start at each separator. Memoize the
+    # position -> token index lookup so each distinct boundary is
+    # bisected once.
+    token_index_cache: dict = {}
+
+    def token_index(pos: int) -> int:
+        """Index of the first token starting at or after pos."""
+        cached = token_index_cache.get(pos)
+        if cached is None:
+            cached = token_index_cache[pos] = bisect_left(token_starts, pos)
+        return cached
+
+    def count_range(a: int, b: int) -> int:
+        """Token count of text[a:b], derived from the full-text encoding."""
+        return token_index(b) - token_index(a) + special_tokens_overhead
 
     def optimize_chunks(
         chunks: List[Tuple[int, str, int]],
-    ) -> List[Tuple[int, str, int]]:
-        """Optimize chunks to ensure maximum token utilization."""
-        if len(chunks) <= 1:
-            return chunks
+    ) -> Iterator[Tuple[int, str, int]]:
+        """Optimize chunks to ensure maximum token utilization.
+
+        Runs as a streaming pipeline: chunks are pulled from the front
+        of a deque and yielded as soon as they are final, and a
+        redistributed second half is pushed back on the front to be
+        reconsidered against its new neighbour. Peak memory stays at
+        one pass of chunk metadata and callers may consume lazily.
+        """
+        pending = deque(chunks)
 
-        optimized: List[Tuple[int, str, int]] = []
-        i = 0
+        while pending:
+            current_start, current_text, current_tokens = pending.popleft()
 
-        while i < len(chunks) - 1:
-            current_start, current_text, current_tokens = chunks[i]
-            next_start, next_text, next_tokens = chunks[i + 1]
+            if not pending:
+                # Last chunk, nothing left to merge with
+                yield (current_start, current_text, current_tokens)
+                break
 
-            # Calculate token count for combined text only if needed
-            combined_text = current_text + next_text
-            combined_tokens = get_token_count(combined_text)
+            next_start, next_text, next_tokens = pending[0]
+            next_end = next_start + len(next_text)
+
+            # Counts from the shared encoding are additive across
+            # adjacent ranges (each carries one special-token overhead),
+            # so the merged count needs no lookup at all.
+            combined_tokens = current_tokens + next_tokens - special_tokens_overhead
 
             # If combining both chunks doesn't exceed max_tokens, merge them
             if combined_tokens <= max_tokens:
-                optimized.append((current_start, combined_text, combined_tokens))
-                i += 2  # Skip next chunk since we've merged it
+                pending.popleft()
+                yield (
+                    current_start,
+                    "".join((current_text, next_text)),
+                    combined_tokens,
+                )
             else:
                 # Check if we can redistribute tokens more efficiently
-                # Try to find optimal split point at a separator
+                # by splitting the current chunk at a separator.
+                # Candidates come straight from the global per-level
+                # separator arrays — two np.searchsorted calls select
+                # this chunk's slice, so no per-character scan runs
+                # here. Levels are tried from the highest weight down;
+                # within a level the first-half token count grows with
+                # the split position, so the largest fitting split can
+                # be found by binary search instead of counting every
+                # candidate.
                 best_split_idx = None
-                best_split_weight = -1
-
-                for j in range(len(current_text) - 1, 0, -1):
-                    char_weight = get_weight(current_text[j])
-
-                    # For sentence terminators, include them in the first chunk
-                    # We need to check if this is a valid split position - the character
-                    # should end the current chunk rather than start the next one
-                    if char_weight > best_split_weight:
-                        split_pos = j + 1  # Include the separator in the first chunk
-
-                        # Make sure we don't exceed the string length
-                        if split_pos <= len(current_text):
-                            # Check if redistributing at this point improves token usage
-                            potential_first = current_text[:split_pos]
-                            potential_next = current_text[split_pos:] + next_text
-
-                            # Get token counts for potential chunks
-                            potential_first_tokens = get_token_count(potential_first)
-                            potential_next_tokens = get_token_count(potential_next)
-
-                            # Ensure both chunks are valid
-                            if (
-                                potential_first_tokens <= max_tokens
-                                and potential_next_tokens <= max_tokens
-                            ):
-                                best_split_idx = split_pos
-                                best_split_weight = char_weight
+                current_end = current_start + len(current_text)
+
+                # A viable split must also leave the second half within
+                # max_tokens, which bounds how far left of the chunk end
+                # it can sit. The request suggested estimating this
+                # window from average chars per token; with exact counts
+                # from the shared encoding the leftmost viable position
+                # is known precisely, so candidates left of it are never
+                # probed and any candidate inside the window already
+                # satisfies the second-half constraint.
+                spare_tokens = max_tokens - special_tokens_overhead
+                min_token = token_index(next_end) - spare_tokens
+                if min_token <= 0:
+                    window_start = current_start + 1
+                else:
+                    window_start = token_starts[min_token - 1] + 1
+
+                for target_weight in WEIGHTS[:-1]:
+                    level_positions = separators_from_weight[target_weight]
+                    # Separators strictly inside the chunk (a split at
+                    # its first character would leave an empty half) and
+                    # inside the viable window.
+                    first = np.searchsorted(
+                        level_positions, max(current_start + 1, window_start - 1)
+                    )
+                    last = np.searchsorted(level_positions, current_end)
+                    if first == last:
+                        continue
+
+                    # Greedy first-fit: if the first half fits at the
+                    # rightmost candidate, it is by construction the
+                    # largest fitting split at this level, so the binary
+                    # search below is unnecessary. The separator is
+                    # included in the first chunk, so the split point is
+                    # one past the separator position.
+                    last_split = int(level_positions[last - 1]) + 1
+                    if count_range(current_start, last_split) <= max_tokens:
+                        candidate = last_split
+                    else:
+                        # Binary-search the largest split position whose
+                        # first half still fits within max_tokens.
+                        lo, hi = first, last - 1
+                        candidate = None
+                        while lo <= hi:
+                            mid = (lo + hi) // 2
+                            split_pos = int(level_positions[mid]) + 1
+                            if count_range(current_start, split_pos) <= max_tokens:
+                                candidate = split_pos
+                                lo = mid + 1
+                            else:
+                                hi = mid - 1
+
+                    if candidate is None:
+                        continue
+
+                    # Candidates inside the window leave a fitting second
+                    # half by construction, so this level is decided.
+                    best_split_idx = candidate - current_start
+                    break
 
                 if best_split_idx is not None:
-                    # Redistribute content between chunks
+                    # Redistribute content between chunks: yield the
+                    # first part and push the enlarged second part back
+                    # on the front so it is reconsidered next round.
                     first_part = current_text[:best_split_idx]
-                    first_tokens = get_token_count(first_part)
-                    optimized.append((current_start, first_part, first_tokens))
-
-                    second_part = current_text[best_split_idx:] + next_text
-                    second_tokens = get_token_count(second_part)
-                    chunks[i + 1] = (
-                        current_start + best_split_idx,
-                        second_part,
-                        second_tokens,
+                    first_tokens = count_range(
+                        current_start, current_start + best_split_idx
+                    )
+                    yield (current_start, first_part, first_tokens)
+
+                    # Only the winning split is ever materialized; the
+                    # candidates above were scored purely on offsets.
+                    second_part = "".join((current_text[best_split_idx:], next_text))
+                    second_tokens = count_range(
+                        current_start + best_split_idx, next_end
+                    )
+                    pending.popleft()
+                    pending.appendleft(
+                        (
+                            current_start + best_split_idx,
+                            second_part,
+                            second_tokens,
+                        )
                     )
                 else:
                     # Cannot optimize further, keep original chunk
-                    optimized.append((current_start, current_text, current_tokens))
-                i += 1
+                    yield (current_start, current_text, current_tokens)
 
-        # Don't forget the last chunk if we didn't merge it
-        if i < len(chunks):
-            optimized.append(chunks[i])
+    def split_by_weight(lo: int, hi: int, weight: int) -> List[Tuple[int, str, int]]:
+        """Iteratively split text[lo:hi], starting at the given weight level.
 
-        if len(optimized) and optimized[-1][1].strip() == "":
-            optimized.pop()
+        Ranges whose segments don't fit descend one weight level at a
+        time via an explicit work stack; separator positions come from
+        the precomputed per-level index arrays, so no range re-scans
+        its characters.
+        """
+        chunks = []
+        # LIFO stack of (lo, hi, weight) ranges still to process, pushed
+        # so that ranges come off the stack in document order.
+        stack = [(lo, hi, weight)]
+
+        while stack:
+            lo, hi, weight = stack.pop()
+            # The open chunk is always the contiguous range
+            # text[current_chunk_start:current_pos], so two ints replace
+            # a list of segment strings; the text is sliced exactly once
+            # when the chunk is finalized.
+            current_pos = lo
+            current_chunk_start = lo
+            current_chunk_tokens = 0
+            descended = False
+
+            if weight > NO_WEIGHT:
+                positions = separators_from_weight[weight]
+                window = slice(
+                    np.searchsorted(positions, lo), np.searchsorted(positions, hi)
+                )
+                separator_positions = positions[window].tolist()
+            else:
+                # At NO_WEIGHT every position is a potential split
+                separator_positions = range(lo, hi)
 
-        return optimized
+            for i in separator_positions:
+                # Try to extend the open chunk through this separator.
+                # The chunk and the new segment form one contiguous
+                # range, so a single lookup counts them together.
+                extended_tokens = count_range(current_chunk_start, i + 1)
 
-    def split_by_weight(
-        text: str, weight: int, start_idx: int
-    ) -> List[Tuple[int, str, int]]:
-        """Recursively split text at the given weight level."""
-        chunks = []
-        current_pos = 0
-        current_chunk = []
-        current_chunk_tokens = 0
-        current_chunk_start = start_idx
-
-        i = 0
-        while i < len(text):
-            char = text[i]
-            char_weight = get_weight(char)
-
-            # Consider splitting if we hit a separator of the current weight
-            if char_weight >= weight:
-                # Try to add the current segment to the chunk
-                segment = text[
-                    current_pos : i + 1
-                ]  # Include the separator in this chunk
-                segment_tokens = get_token_count(segment)
-
-                if current_chunk_tokens + segment_tokens <= max_tokens:
-                    current_chunk.append(segment)
-                    current_chunk_tokens += segment_tokens
+                if extended_tokens <= max_tokens:
+                    # The separator is included in this chunk
                     current_pos = i + 1  # Start next segment after the separator
+                    current_chunk_tokens = extended_tokens
                 else:
-                    # If adding this segment exceeds max_tokens, finalize current chunk
-                    if current_chunk:
-                        chunk_text = "".join(current_chunk)
+                    segment_tokens = count_range(current_pos, i + 1)
+
+                    # Adding this segment exceeds max_tokens, so finalize
+                    # the current chunk first
+                    if current_pos > current_chunk_start:
                         chunks.append(
-                            (current_chunk_start, chunk_text, current_chunk_tokens)
+                            (
+                                current_chunk_start,
+                                text[current_chunk_start:current_pos],
+                                current_chunk_tokens,
+                            )
                         )
-                        current_chunk_start += len(chunk_text)
-                        current_chunk = []
+                        current_chunk_start = current_pos
                         current_chunk_tokens = 0
 
-                    # If single segment exceeds max_tokens, try lower weight
+                    # If single segment exceeds max_tokens, descend to the
+                    # next weight level for it, then resume this level on
+                    # the rest of the range.
                     if segment_tokens > max_tokens and weight > NO_WEIGHT:
-                        sub_chunks = split_by_weight(
-                            segment, weight - 1, current_chunk_start
-                        )
-                        chunks.extend(sub_chunks)
-                        current_chunk_start += len(segment)
-                        current_pos = i + 1
+                        stack.append((i + 1, hi, weight))
+                        stack.append((current_pos, i + 1, weight - 1))
+                        descended = True
+                        break
                     elif segment_tokens <= max_tokens:
-                        current_chunk.append(segment)
-                        current_chunk_tokens = segment_tokens
                         current_pos = i + 1
+                        current_chunk_tokens = segment_tokens
                     else:
                         raise ValueError(
                             "Cannot split segment within token limit; "
                             "consider increasing max_tokens"
                         )
 
-            i += 1
+            if descended:
+                continue
 
-        # Handle remaining text
-        if current_pos < len(text):
-            remaining = text[current_pos:]
-            remaining_tokens = get_token_count(remaining)
+            # Handle remaining text
+            if current_pos < hi:
+                extended_tokens = count_range(current_chunk_start, hi)
 
-            if current_chunk_tokens + remaining_tokens <= max_tokens:
-                current_chunk.append(remaining)
-                current_chunk_tokens += remaining_tokens
-            else:
-                if current_chunk:
-                    chunk_text = "".join(current_chunk)
-                    chunks.append(
-                        (current_chunk_start, chunk_text, current_chunk_tokens)
-                    )
-                    current_chunk_start += len(chunk_text)
-
-                if remaining_tokens > max_tokens and weight > NO_WEIGHT:
-                    sub_chunks = split_by_weight(
-                        remaining, weight - 1, current_chunk_start
-                    )
-                    chunks.extend(sub_chunks)
-                elif remaining_tokens <= max_tokens:
-                    chunks.append((current_chunk_start, remaining, remaining_tokens))
+                if extended_tokens <= max_tokens:
+                    current_pos = hi
+                    current_chunk_tokens = extended_tokens
                 else:
-                    raise ValueError(
-                        "Cannot split remaining text within token limit; "
-                        "consider increasing max_tokens"
-                    )
+                    remaining_tokens = count_range(current_pos, hi)
+
+                    if current_pos > current_chunk_start:
+                        chunks.append(
+                            (
+                                current_chunk_start,
+                                text[current_chunk_start:current_pos],
+                                current_chunk_tokens,
+                            )
+                        )
+                        current_chunk_start = current_pos
+                        current_chunk_tokens = 0
 
-        # Add final chunk if exists
-        if current_chunk:
-            chunk_text = "".join(current_chunk)
-            chunks.append((current_chunk_start, chunk_text, current_chunk_tokens))
+                    if remaining_tokens > max_tokens and weight > NO_WEIGHT:
+                        stack.append((current_pos, hi, weight - 1))
+                        continue
+                    elif remaining_tokens <= max_tokens:
+                        current_pos = hi
+                        current_chunk_tokens = remaining_tokens
+                    else:
+                        raise ValueError(
+                            "Cannot split remaining text within token limit; "
+                            "consider increasing max_tokens"
+                        )
+
+            # Add final chunk if exists
+            if current_pos > current_chunk_start:
+                chunks.append(
+                    (
+                        current_chunk_start,
+                        text[current_chunk_start:current_pos],
+                        current_chunk_tokens,
+                    )
+                )
 
         return chunks
 
     # First split with original algorithm
-    initial_chunks = split_by_weight(text, PARAGRAPH_SEPARATOR_WEIGHT, 0)
+    initial_chunks = split_by_weight(0, len(text), PARAGRAPH_SEPARATOR_WEIGHT)
 
     if optimize:
-        # Then optimize to ensure maximum token utilization
-        return optimize_chunks(initial_chunks)
+        # Then optimize to ensure maximum token utilization; the
+        # pipeline yields lazily, materialize at the outer boundary.
+        optimized = list(optimize_chunks(initial_chunks))
+
+        if len(optimized) and optimized[-1][1].strip() == "":
+            optimized.pop()
+
+        return optimized
 
     return initial_chunks